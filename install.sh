@@ -19,10 +19,17 @@ echo "====================================================="
 # Get the directory where the script is located
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
 INSTALL_DIR="/opt/jlbmaritime-wifi-manager"
+# Interpreter the service runs under; set WIFI_MANAGER_PYTHON=/usr/bin/pypy3 to use PyPy
+# (re-running the script restarts an existing service under it)
+PYTHON_BIN="${WIFI_MANAGER_PYTHON:-/usr/bin/python3}"
+
+# An earlier install's service may still be listening on port 80, which nginx
+# needs; stop it here and it is restarted on its new port at the end
+systemctl stop wifi-manager.service 2>/dev/null || true
 
 echo "Installing dependencies..."
 apt-get update
-apt-get install -y python3-full python3-flask python3-pil wireless-tools network-manager avahi-daemon
+apt-get install -y python3-full python3-flask python3-flask-compress python3-waitress python3-asgiref wireless-tools network-manager avahi-daemon nginx
 
 # We use system packages instead of pip to avoid externally-managed-environment issues
 echo "Checking Python packages..."
@@ -31,9 +38,24 @@ if ! dpkg -l | grep -q python3-flask; then
     apt-get install -y python3-flask
 fi
 
-if ! dpkg -l | grep -q python3-pil; then
-    echo "Installing Pillow from apt..."
-    apt-get install -y python3-pil
+if ! dpkg -l | grep -q python3-flask-compress; then
+    echo "Installing Flask-Compress from apt..."
+    apt-get install -y python3-flask-compress
+fi
+
+if ! dpkg -l | grep -q python3-orjson; then
+    echo "Installing orjson from apt..."
+    apt-get install -y python3-orjson || echo "orjson not available, using the standard json module"
+fi
+
+if ! dpkg -l | grep -q python3-waitress; then
+    echo "Installing waitress from apt..."
+    apt-get install -y python3-waitress
+fi
+
+if ! dpkg -l | grep -q python3-asgiref; then
+    echo "Installing asgiref (Flask async view support) from apt..."
+    apt-get install -y python3-asgiref
 fi
 
 # Check if NetworkManager is installed and running
@@ -85,16 +107,50 @@ EOF
 # Restart Avahi
 systemctl restart avahi-daemon
 
+# Set up nginx to serve static files and proxy everything else to Flask
+echo "Configuring nginx..."
+cat > /etc/nginx/sites-available/wifi-manager << 'EOF'
+server {
+    listen 80 default_server;
+    listen [::]:80 default_server;
+    server_name _;
+
+    # Static assets go straight from the page cache to the socket
+    location /static/ {
+        root /opt/jlbmaritime-wifi-manager;
+        sendfile on;
+        tcp_nopush on;
+        expires 1h;
+    }
+
+    location / {
+        proxy_pass http://127.0.0.1:8080;
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        # A connect attempt is bounded to about 100 s by wifi_manager.py
+        # (CONNECT_ATTEMPT_TIMEOUT); keep this above that
+        proxy_read_timeout 120s;
+    }
+}
+EOF
+ln -sf /etc/nginx/sites-available/wifi-manager /etc/nginx/sites-enabled/wifi-manager
+rm -f /etc/nginx/sites-enabled/default
+systemctl enable nginx
+systemctl restart nginx
+
 # Create systemd service
 echo "Creating systemd service..."
 cat > /etc/systemd/system/wifi-manager.service << EOF
 [Unit]
 Description=JLBMaritime Wi-Fi Manager
 After=network.target
+Wants=nginx.service
 
 [Service]
-ExecStart=/usr/bin/python3 /opt/jlbmaritime-wifi-manager/web_interface.py
+ExecStart=$PYTHON_BIN /opt/jlbmaritime-wifi-manager/web_interface.py
 WorkingDirectory=/opt/jlbmaritime-wifi-manager
+Environment=WIFI_MANAGER_HOST=127.0.0.1
+Environment=WIFI_MANAGER_PORT=8080
 Restart=always
 User=root
 
@@ -102,11 +158,11 @@ User=root
 WantedBy=multi-user.target
 EOF
 
-# Enable and start service
+# Enable and (re)start service, so a reinstall picks up the new unit
 echo "Enabling and starting service..."
 systemctl daemon-reload
 systemctl enable wifi-manager.service
-systemctl start wifi-manager.service
+systemctl restart wifi-manager.service
 
 echo "====================================================="
 echo "Installation complete!"
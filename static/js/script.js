@@ -27,7 +27,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function init() {
         // Set up event listeners
-        scanButton.addEventListener('click', scanNetworks);
+        scanButton.addEventListener('click', () => scanNetworks(true));
         pingButton.addEventListener('click', runPingTest);
         closeButton.addEventListener('click', closeModal);
         passwordForm.addEventListener('submit', connectWithPassword);
@@ -117,12 +117,12 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function scanNetworks() {
+    async function scanNetworks(rescan = false) {
         scanButton.disabled = true;
         scanButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Scanning...';
         networksList.innerHTML = '<div class="loading">Scanning...</div>';
         
-        const data = await fetchAPI('scan');
+        const data = await fetchAPI(rescan ? 'scan?rescan=true' : 'scan');
         
         scanButton.disabled = false;
         scanButton.innerHTML = '<i class="fas fa-sync-alt"></i> Scan';
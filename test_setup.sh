@@ -22,8 +22,8 @@ python3 -c "import flask" 2>/dev/null || {
     echo "Flask is required. Install with: sudo apt install python3-flask"; 
     exit 1; 
 }
-python3 -c "import PIL" 2>/dev/null || { 
-    echo "Pillow is required. Install with: sudo apt install python3-pil"; 
+python3 -c "import asgiref" 2>/dev/null || { 
+    echo "asgiref is required for Flask async views. Install with: sudo apt install python3-asgiref"; 
     exit 1; 
 }
 
@@ -1,163 +1,510 @@
 #!/usr/bin/env python3
-from flask import Flask, render_template, request, jsonify, Response, send_from_directory
+from flask import Flask, render_template, request, Response, current_app, abort
+from werkzeug.http import http_date
 import wifi_manager
+import asyncio
+import base64
+import binascii
+import hmac
 import json
 import os
+import re
+import signal
+import subprocess
+import sys
 import functools
+import hashlib
+import math
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-app = Flask(__name__)
+# Resolve the application directories once at import time
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_STATIC = os.path.join(_BASE, 'static')
+_IMG = os.path.join(_STATIC, 'img')
+
+app = Flask(__name__, static_folder=_STATIC)
+# Let browsers reuse static files for an hour instead of revalidating each load
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.jinja_env.auto_reload = False
+
+# Compress responses when flask-compress is available
+try:
+    from flask_compress import Compress
+    Compress(app)
+except ImportError:
+    pass
+
+# Use orjson for API requests and responses when available, falling back to the stdlib
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode()
+    _loads = json.loads
+
+# Extra seconds allowed on top of one second per ping before giving up
+PING_TIMEOUT_MARGIN = 5
+
+# Hostnames and IPv4/IPv6 addresses accepted as ping targets. The first
+# character may not be '-' so a target can never be read as a ping option.
+_PING_TARGET_RE = re.compile(r'[A-Za-z0-9.:][A-Za-z0-9.:-]{0,252}')
+
+# Matches every field we read from ping output in one pass: a reply time
+# (group 1) or the packet loss percentage (group 2)
+_PING_STATS_RE = re.compile(r'time=([\d.]+)|(\d+)% packet loss')
+
+# Address the web server listens on. install.sh puts it behind nginx on
+# 127.0.0.1:8080 so static files are sent by nginx instead of Python.
+HOST = os.environ.get('WIFI_MANAGER_HOST', '0.0.0.0')
+PORT = int(os.environ.get('WIFI_MANAGER_PORT', '80'))
+# Request threads, so a slow ping or connect does not hold up other clients
+SERVER_THREADS = 8
+
+# On a Pi with 4 or more cores, the last core runs the background scanner
+# and the nmcli/ping processes it spawns, and request handling keeps the rest
+_CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+SCANNER_CPUS = set(_CPUS[-1:]) if len(_CPUS) >= 4 else set()
+WEB_CPUS = set(_CPUS[:-1]) if len(_CPUS) >= 4 else set()
+# Niceness added to the scanner so it never preempts request handlers
+SCANNER_NICE = 5
 
 # Path to the logo file
-LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'img', 'logo.png')
+LOGO_PATH = os.path.join(_IMG, 'logo.png')
+
+# Web interface credentials
+AUTH_USERNAME = 'JLBMaritime'
+AUTH_PASSWORD = 'Admin'
+_AUTH_DIGEST = hashlib.sha256(f"{AUTH_USERNAME}:{AUTH_PASSWORD}".encode()).digest()
+
+@functools.lru_cache(maxsize=8)
+def _check_auth(header):
+    """Check a raw Basic Authorization header value against the credentials."""
+    scheme, _, token = header.partition(b' ')
+    if scheme.lower() != b'basic':
+        return False
+    try:
+        credentials = base64.b64decode(token, validate=True)
+    except binascii.Error:
+        return False
+    # Compare fixed-length digests in constant time
+    return hmac.compare_digest(hashlib.sha256(credentials).digest(), _AUTH_DIGEST)
+
+def json_response(obj, status=200):
+    """Serialize obj into an application/json response."""
+    return Response(_dumps(obj), status=status, mimetype='application/json')
+
+def request_json(*required):
+    """Parse the request body as a JSON object, rejecting malformed input with a 400.
+    
+    Each name in required must be present in the object as a string.
+    """
+    try:
+        data = _loads(request.get_data() or b'{}')
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        abort(json_response({
+            "success": False,
+            "message": "Request body must be a JSON object"
+        }, 400))
+    for key in required:
+        if not isinstance(data.get(key), str):
+            abort(json_response({
+                "success": False,
+                "message": f"Missing or invalid field: {key}"
+            }, 400))
+    return data
+
+def serialize_cached(obj):
+    """Serialize obj once for caching, along with its ETag."""
+    body = _dumps(obj)
+    return {
+        'body': body,
+        'etag': hashlib.blake2b(body, digest_size=8).hexdigest(),
+        'updated': time.time()
+    }
+
+# Older Flask-Compress (1.13 on Bookworm) appends the encoding to the ETag
+# after we have answered, e.g. "abc:gzip", without re-checking the request,
+# so the tag a browser revalidates with has to lose that suffix again
+_COMPRESSED_ETAG_RE = re.compile(r':(?:gzip|br|deflate|zstd)"')
+
+def make_conditional(response):
+    """Turn response into a 304 if the client's ETag still matches it."""
+    environ = request.environ
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        environ = {**environ, 'HTTP_IF_NONE_MATCH': _COMPRESSED_ETAG_RE.sub('"', if_none_match)}
+    return response.make_conditional(environ)
+
+def cached_json_response(entry):
+    """Answer with a cached body, or 304 if the client already has it."""
+    response = Response(entry['body'], mimetype='application/json',
+                        headers={'Cache-Control': 'no-cache'})
+    response.set_etag(entry['etag'])
+    # Lets the client tell how old a cached result is
+    response.headers['Last-Updated'] = http_date(entry['updated'])
+    return make_conditional(response)
 
 # Authentication decorator
 def requires_auth(f):
     @functools.wraps(f)
     def decorated(*args, **kwargs):
-        auth = request.authorization
-        if not auth or auth.username != 'JLBMaritime' or auth.password != 'Admin':
+        # Repeat requests from the same browser send an identical header,
+        # so the decision is cached on the raw bytes
+        header = request.headers.get('Authorization', '').encode('latin-1')
+        if not _check_auth(header):
             return Response('Login required', 401,
                 {'WWW-Authenticate': 'Basic realm="Login Required"'})
-        return f(*args, **kwargs)
+        # ensure_sync lets the decorator wrap async views as well
+        return current_app.ensure_sync(f)(*args, **kwargs)
     return decorated
 
 # Background scanning thread
-def background_scanner():
+# Set by request handlers to wake the scanner as soon as a client needs data
+scan_event = threading.Event()
+# Notified by the scanner every time it publishes a fresh result
+status_cv = threading.Condition()
+# Latest results published by the scanner (and by /api/connect for
+# 'current'), keyed by endpoint and already serialized by serialize_cached().
+# Writers go through publish_status(), which replaces whole entries under
+# status_cv, so handlers read it without taking a lock.
+status_snapshot = {}
+
+# Upper bound on how long the scanner sleeps when nobody is asking for data
+SCANNER_IDLE_TIMEOUT = 30
+# How long a request handler waits for the scanner's first result after startup
+FIRST_STATUS_TIMEOUT = 15
+# Delay before restarting `nmcli monitor` if it exits, e.g. when NetworkManager restarts
+MONITOR_RESTART_DELAY = 5
+# How long scan results are served from cache before shelling out again
+SCAN_CACHE_TTL = 30
+
+# Scan results shared by /api/scan and the background scanner. 'time' is on
+# the monotonic clock, which counts from boot, so "never" is -inf rather than 0
+_scan_cache = {'time': -math.inf, 'entry': None}
+_scan_lock = threading.Lock()
+
+# Sanitized /api/saved response and the config dict it was built from. It is
+# rebuilt after our own save/forget, and whenever load_config() returns a
+# different dict because config.json was changed by another process
+_saved_cache = {'config': None, 'entry': None}
+_saved_lock = threading.Lock()
+
+# Workers the scanner uses to refresh independent results concurrently
+_scanner_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='scanner')
+
+def publish_status(key, value, sampled=None):
+    """Store a status result and wake any handlers waiting for it.
+    
+    sampled is the time.monotonic() at which gathering value began. A result
+    sampled before the one already stored is dropped, so a scanner job that
+    started mid-connect cannot overwrite the connection /api/connect published.
+    """
+    if sampled is None:
+        sampled = time.monotonic()
+    entry = serialize_cached(value)
+    entry['sampled'] = sampled
+    with status_cv:
+        previous = status_snapshot.get(key)
+        if previous is not None and previous['sampled'] > sampled:
+            return
+        status_snapshot[key] = entry
+        status_cv.notify_all()
+
+def snapshot_response(key):
+    """Answer from the scanner's latest result for key and wake it for the next poll."""
+    scan_event.set()
+    entry = status_snapshot.get(key)
+    if entry is None:
+        # Only before the scanner's first cycle has finished
+        with status_cv:
+            status_cv.wait_for(lambda: key in status_snapshot,
+                               timeout=FIRST_STATUS_TIMEOUT)
+        entry = status_snapshot.get(key)
+        if entry is None:
+            return json_response({
+                "success": False,
+                "message": "Status not available yet"
+            }, 503)
+    return cached_json_response(entry)
+
+def cached_scan(rescan=False):
+    """Return the cached scan results, rescanning if forced or stale."""
+    with _scan_lock:
+        now = time.monotonic()
+        if (rescan or _scan_cache['entry'] is None
+                or now - _scan_cache['time'] >= SCAN_CACHE_TTL):
+            # Stamp the attempt first so a failing scan is not retried back to back
+            _scan_cache['time'] = now
+            _scan_cache['entry'] = serialize_cached(wifi_manager.scan_networks())
+        return _scan_cache['entry']
+
+def invalidate_saved():
+    """Drop the cached /api/saved response after saved networks change."""
+    with _saved_lock:
+        _saved_cache['entry'] = None
+
+def pin_current_thread(cpus):
+    """Restrict the calling thread, and anything it starts, to the given CPUs."""
+    if not cpus:
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print(f"Could not set CPU affinity: {e}")
+
+# Set while a long-lived `nmcli monitor` is reporting NetworkManager state changes
+monitor_running = threading.Event()
+
+def network_monitor():
+    """Wake the scanner whenever NetworkManager reports a state change."""
     while True:
         try:
-            # Get current connection status
-            wifi_manager.get_current_connection()
-            
-            # Run diagnostics to update connectivity and DNS status
-            wifi_manager.run_diagnostics()
-            
-            # Scan networks less frequently (every 2 cycles)
-            if int(time.time()) % 60 < 30:  # Only scan during first 30 seconds of each minute
-                wifi_manager.scan_networks()
+            monitor = subprocess.Popen(
+                ['nmcli', 'monitor'],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                errors='replace',
+                bufsize=1
+            )
+        except OSError:
+            # NetworkManager is not installed; the scanner polls on its own
+            return
+        
+        monitor_running.set()
+        try:
+            # One pipe read per state change replaces polling nmcli every cycle
+            for _ in monitor.stdout:
+                scan_event.set()
         except Exception as e:
-            print(f"Error in background scanner: {e}")
+            print(f"Error reading nmcli monitor: {e}")
+        finally:
+            # Whatever ended the loop, let the scanner poll again until the
+            # monitor is back, and don't leave nmcli running unread
+            monitor_running.clear()
+            monitor.kill()
+            monitor.wait()
+            monitor.stdout.close()
+        time.sleep(MONITOR_RESTART_DELAY)
+
+def background_scanner():
+    # Affinity and niceness are per-thread on Linux and are inherited by the
+    # pool workers, monitor thread and subprocesses this thread starts
+    pin_current_thread(SCANNER_CPUS)
+    try:
+        os.nice(SCANNER_NICE)
+    except OSError as e:
+        print(f"Could not lower scanner priority: {e}")
+    threading.Thread(target=network_monitor, daemon=True).start()
+    
+    while True:
+        # Sleep until a handler asks for data, NetworkManager reports a change
+        # or the cached scan expires, measured on the monotonic clock so NTP
+        # steps at boot don't matter
+        next_scan = _scan_cache['time'] + SCAN_CACHE_TTL
+        timeout = min(SCANNER_IDLE_TIMEOUT, next_scan - time.monotonic())
+        triggered = scan_event.wait(timeout=max(0.0, timeout))
+        scan_event.clear()
         
-        # Sleep for 15 seconds between updates
-        time.sleep(15)
+        # Diagnostics and the scan are independent, so run their subprocesses
+        # side by side and publish each as soon as it is ready
+        jobs = {}
+        started = time.monotonic()
+        # While nmcli monitor is running an untriggered wake means nothing has
+        # changed and nobody is asking, so the status is left as it is
+        if triggered or not monitor_running.is_set():
+            # Diagnostics refresh the connection status anyway; it is
+            # published as soon as it is known rather than fetched twice
+            jobs[_scanner_pool.submit(
+                wifi_manager.run_diagnostics,
+                on_connection=functools.partial(publish_status, 'current', sampled=started)
+            )] = 'diagnostics'
+        if time.monotonic() >= next_scan:
+            # cached_scan() stores its own result
+            jobs[_scanner_pool.submit(cached_scan)] = None
+        for job in as_completed(jobs):
+            try:
+                result = job.result()
+            except Exception as e:
+                print(f"Error in background scanner: {e}")
+                continue
+            if jobs[job]:
+                publish_status(jobs[job], result, sampled=started)
 
-# Start background scanner thread
+# Start background scanner thread, running its first cycle immediately
+scan_event.set()
 scanner_thread = threading.Thread(target=background_scanner, daemon=True)
 scanner_thread.start()
 
+# index.html has no per-request state, so render it once at startup
+with app.app_context():
+    _INDEX_HTML = render_template('index.html')
+_INDEX_ETAG = hashlib.sha1(_INDEX_HTML.encode()).hexdigest()
+
 # Web routes
 @app.route('/')
 @requires_auth
 def index():
-    return render_template('index.html')
-
-@app.route('/static/<path:path>')
-def serve_static(path):
-    return send_from_directory('static', path)
+    response = Response(_INDEX_HTML, mimetype='text/html')
+    response.set_etag(_INDEX_ETAG)
+    return make_conditional(response)
 
 @app.route('/api/scan', methods=['GET'])
 @requires_auth
 def scan():
-    networks = wifi_manager.scan_networks()
-    return jsonify(networks)
+    rescan = request.args.get('rescan', 'false').lower() == 'true'
+    return cached_json_response(cached_scan(rescan))
 
 @app.route('/api/current', methods=['GET'])
 @requires_auth
 def current():
-    connection = wifi_manager.get_current_connection()
-    return jsonify(connection)
+    return snapshot_response('current')
 
 @app.route('/api/saved', methods=['GET'])
 @requires_auth
 def saved():
     config = wifi_manager.load_config()
-    # Remove passwords from response for security
-    saved_networks = []
-    for network in config.get('saved_networks', []):
-        network_copy = network.copy()
-        if 'password' in network_copy:
-            network_copy['password'] = '********'
-        saved_networks.append(network_copy)
-    return jsonify(saved_networks)
+    with _saved_lock:
+        if _saved_cache['entry'] is None or _saved_cache['config'] is not config:
+            # Remove passwords from response for security
+            saved_networks = [
+                {**network, 'password': '********'} if 'password' in network else network.copy()
+                for network in config.get('saved_networks', [])
+            ]
+            _saved_cache['config'] = config
+            _saved_cache['entry'] = serialize_cached(saved_networks)
+        entry = _saved_cache['entry']
+    return cached_json_response(entry)
 
 @app.route('/api/connect', methods=['POST'])
 @requires_auth
 def connect():
-    data = request.json
+    data = request_json('ssid')
     result = wifi_manager.connect_to_network(
         data['ssid'], 
         data.get('password'), 
         data.get('security', 'WPA2')
     )
-    return jsonify(result)
+    if result['success']:
+        # The UI reloads the current connection straight away, so publish the
+        # fresh details rather than leaving the old snapshot until the next cycle
+        publish_status('current', result['connection'])
+        # A successful connection may have saved the network
+        invalidate_saved()
+    # Refresh the rest of the cached status now that the connection may have changed
+    scan_event.set()
+    return json_response(result)
 
 @app.route('/api/save', methods=['POST'])
 @requires_auth
 def save():
-    data = request.json
+    data = request_json('ssid', 'password')
     result = wifi_manager.save_network(
         data['ssid'], 
         data['password'], 
         data.get('security', 'WPA2')
     )
-    return jsonify(result)
+    if result['success']:
+        invalidate_saved()
+    return json_response(result)
 
 @app.route('/api/forget', methods=['POST'])
 @requires_auth
 def forget():
-    data = request.json
+    data = request_json('ssid')
     result = wifi_manager.forget_network(data['ssid'])
-    return jsonify(result)
+    if result['success']:
+        invalidate_saved()
+    return json_response(result)
 
 @app.route('/api/diagnostics', methods=['GET'])
 @requires_auth
 def diagnostics():
-    results = wifi_manager.run_diagnostics()
-    return jsonify(results)
+    return snapshot_response('diagnostics')
 
 @app.route('/api/ping', methods=['POST'])
 @requires_auth
-def ping():
-    data = request.json
-    target = data.get('target', '8.8.8.8')
-    count = min(int(data.get('count', 4)), 10)  # Limit to 10 pings max
+async def ping():
+    data = request_json()
+    target = str(data.get('target', '8.8.8.8'))
+    if not _PING_TARGET_RE.fullmatch(target):
+        return json_response({
+            "success": False,
+            "message": f"Invalid ping target: {target}"
+        }, 400)
+    try:
+        count = min(max(int(data.get('count', 4)), 1), 10)  # Limit to 10 pings max
+    except (TypeError, ValueError):
+        return json_response({
+            "success": False,
+            "message": f"Invalid ping count: {data.get('count')}"
+        }, 400)
     
-    command = f"ping -c {count} {target}"
-    output = wifi_manager.run_command(command)
+    # Run ping without a shell and without blocking on its output,
+    # waiting at most one second for each reply
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ping', '-c', str(count), '-W', '1', target,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+    except OSError as e:
+        print(f"Error executing ping: {e}")
+        output = ""
+    else:
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(),
+                                            timeout=count + PING_TIMEOUT_MARGIN)
+        except asyncio.TimeoutError:
+            proc.kill()
+            out, _ = await proc.communicate()
+        output = out.decode(errors='replace')
     
-    # Parse ping results
+    # Parse ping results, collecting times, min/max/sum and packet loss
+    # in a single scan over the output
     ping_times = []
-    for line in output.splitlines():
-        if "time=" in line:
-            try:
-                time_str = line.split("time=")[1].split()[0]
-                ping_times.append(float(time_str))
-            except (IndexError, ValueError):
-                pass
+    lo = hi = total = 0.0
+    loss = None
+    for match in _PING_STATS_RE.finditer(output):
+        reply, lost = match.groups()
+        if reply is None:
+            loss = lost
+            continue
+        t = float(reply)
+        lo = t if not ping_times or t < lo else lo
+        hi = t if t > hi else hi
+        total += t
+        ping_times.append(t)
     
     result = {
-        "success": "0% packet loss" in output,
+        "success": loss == "0",
         "output": output,
         "times": ping_times,
         "stats": {
-            "min": min(ping_times) if ping_times else 0,
-            "max": max(ping_times) if ping_times else 0,
-            "avg": sum(ping_times) / len(ping_times) if ping_times else 0
+            "min": lo,
+            "max": hi,
+            "avg": total / len(ping_times) if ping_times else 0
         }
     }
     
-    return jsonify(result)
+    return json_response(result)
 
 if __name__ == '__main__':
     # Check if running as root
     if os.geteuid() != 0:
         print("This script must be run as root (sudo).")
-        import sys
         sys.exit(1)
     
     # Ensure the logo directory exists
-    os.makedirs(os.path.dirname(LOGO_PATH), exist_ok=True)
+    os.makedirs(_IMG, exist_ok=True)
     
     # Check if logo exists and is a valid image file
     if not os.path.exists(LOGO_PATH):
@@ -169,16 +516,24 @@ if __name__ == '__main__':
             import create_placeholder_logo
         except Exception as e:
             print(f"Error creating placeholder logo: {e}")
-            # Create a simple text file as placeholder if all else fails
-            try:
-                with open(LOGO_PATH, 'w') as f:
-                    f.write("Placeholder for logo.png")
-            except Exception:
-                pass
     
     print("Starting JLBMaritime Wi-Fi Manager web server...")
     print("Access the web interface at http://ais.local")
-    print("Username: JLBMaritime")
-    print("Password: Admin")
+    print(f"Username: {AUTH_USERNAME}")
+    print(f"Password: {AUTH_PASSWORD}")
+    
+    # Keep request threads off the scanner's core
+    pin_current_thread(WEB_CPUS)
+    
+    # systemd stops the service with SIGTERM; exit normally so pending
+    # config changes are written out by wifi_manager's atexit hook
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     
-    app.run(host='0.0.0.0', port=80, debug=False)
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed, falling back to the Flask development server.")
+        print("Install it with: sudo apt install python3-waitress")
+        app.run(host=HOST, port=PORT, debug=False, threaded=True)
+    else:
+        serve(app, host=HOST, port=PORT, threads=SERVER_THREADS)
@@ -7,14 +7,85 @@ import time
 import datetime
 import sys
 import getpass
-from typing import Dict, List, Optional, Any, Union
+import atexit
+import select
+import threading
+import shutil
+import shlex
+import math
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Any, Union
 
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
 
-def load_config() -> Dict[str, Any]:
-    """Load configuration from the config file."""
-    if not os.path.exists(CONFIG_FILE):
-        return {
+# Patterns for parsing command output, compiled once at import
+# Every iwlist scan field we read, matched in one alternation; the named
+# group that matched (Match.lastgroup) says which field it is
+_IWLIST_RE = re.compile(
+    r'(?P<cell>Cell \d+ - )'
+    r'|ESSID:"(?P<ssid>[^"]*)"'
+    r'|Quality=(?P<q1>\d+)/(?P<q2>\d+)'
+    r'|Signal level=(?P<dbm>-\d+) dBm'
+    r'|Encryption key:(?P<enc>on|off)'
+)
+_QUALITY_RE = re.compile(r'Quality=(\d+)/(\d+)')
+_SIGNAL_DBM_RE = re.compile(r'Signal level=(-\d+) dBm')
+_PING_TIME_RE = re.compile(r'time=(\d+\.\d+) ms')
+
+# Use orjson for reading and writing the config file when available, falling back to the stdlib
+try:
+    import orjson
+    _loads = orjson.loads
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj):
+        return json.dumps(obj, indent=2).encode()
+
+# Whether NetworkManager is available; looked up on PATH once, without a subprocess
+_NM_INSTALLED = shutil.which("nmcli") is not None
+
+# When scan_networks last got results (time.monotonic()), so connect_to_network
+# can skip forcing another rescan while those results are still fresh.
+# time.monotonic() counts from boot, so "never" has to be -inf, not 0
+_LAST_SCAN_TS = -math.inf
+
+# Serializes config file access between threads refreshing status concurrently
+_config_lock = threading.RLock()
+
+# Parsed config.json, kept in memory and re-read only when the file's mtime
+# changes (e.g. the other interface saved it). save_config only marks it
+# dirty; the file is written by flush_config, at most once per
+# CONFIG_FLUSH_DELAY seconds, and again at exit
+CONFIG_FLUSH_DELAY = 5
+_config_cache: Optional[Dict[str, Any]] = None
+_config_mtime: Optional[int] = None
+_config_dirty = False
+_flush_timer: Optional[threading.Timer] = None
+
+# saved_networks of the cached config indexed by SSID, rebuilt after the
+# cache is reloaded or saved
+_saved_index: Optional[Dict[str, Dict[str, Any]]] = None
+
+def _config_file_mtime() -> Optional[int]:
+    """Return the config file's mtime in nanoseconds, or None if it doesn't exist."""
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _reload_config(mtime: Optional[int]) -> None:
+    """Replace the cached configuration with the config file's contents.
+    
+    Saving or forgetting a network is flushed straight away, so the only
+    change ever left pending is the current_connection written by status
+    refreshes; that is carried over so a write from the other interface
+    (e.g. a network saved from the terminal) is never overwritten.
+    """
+    global _config_cache, _config_mtime, _saved_index
+    if mtime is None:
+        config = {
             "saved_networks": [],
             "current_connection": {
                 "ssid": "",
@@ -27,140 +98,270 @@ def load_config() -> Dict[str, Any]:
                 "scan_interval": 30
             }
         }
+    else:
+        with open(CONFIG_FILE, 'rb') as f:
+            config = _loads(f.read())
     
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
+    if _config_dirty and _config_cache is not None and 'current_connection' in _config_cache:
+        config['current_connection'] = _config_cache['current_connection']
+    
+    _config_cache = config
+    _config_mtime = mtime
+    _saved_index = None
+
+def load_config() -> Dict[str, Any]:
+    """Load configuration, re-reading the config file only when it has changed."""
+    with _config_lock:
+        mtime = _config_file_mtime()
+        if _config_cache is None or mtime != _config_mtime:
+            _reload_config(mtime)
+        return _config_cache
 
 def save_config(config: Dict[str, Any]) -> None:
-    """Save configuration to the config file."""
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    """Update the cached configuration and schedule a write to the config file."""
+    global _config_cache, _config_dirty, _flush_timer, _saved_index
+    with _config_lock:
+        _config_cache = config
+        _saved_index = None
+        _config_dirty = True
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(CONFIG_FLUSH_DELAY, flush_config)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+def flush_config() -> None:
+    """Write the cached configuration to the config file if it has unsaved changes."""
+    global _config_dirty, _config_mtime, _flush_timer
+    with _config_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if not _config_dirty:
+            return
+        
+        # Pick up anything the other interface wrote since we last read the file
+        mtime = _config_file_mtime()
+        if mtime != _config_mtime:
+            _reload_config(mtime)
+        
+        # Write a temporary file and swap it in, so config.json is never
+        # half-written. It holds network passwords, so only root may read it.
+        temp_path = CONFIG_FILE + '.tmp'
+        data = memoryview(_dumps(_config_cache))
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, CONFIG_FILE)
+        _config_mtime = os.stat(CONFIG_FILE).st_mtime_ns
+        _config_dirty = False
+
+atexit.register(flush_config)
+
+def saved_networks_by_ssid(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Index the saved networks (a list in config.json) by SSID.
+    
+    The index of the cached config is built once and shared until the next
+    load or save, so only save_config callers may change saved_networks.
+    """
+    global _saved_index
+    with _config_lock:
+        if config is not _config_cache:
+            return {network['ssid']: network for network in config['saved_networks']}
+        if _saved_index is None:
+            _saved_index = {network['ssid']: network for network in config['saved_networks']}
+        return _saved_index
 
-def run_command(command: str) -> str:
-    """Run a shell command and return its output."""
+def format_command(argv: List[str]) -> str:
+    """Format a command for logging, shell-quoted and with any password masked."""
+    return shlex.join(
+        "********" if i and argv[i - 1] == "password" else arg
+        for i, arg in enumerate(argv)
+    )
+
+def run_command(argv: List[str], timeout: Optional[float] = None, quiet: bool = False) -> str:
+    """Run a command directly, without a shell, and return its output.
+    
+    Errors are printed unless quiet is set; either way an empty string is returned.
+    """
     try:
+        # Our own descriptors are non-inheritable already, so skip closing
+        # them all in the child
         result = subprocess.run(
-            command, 
-            shell=True, 
-            check=True, 
-            stdout=subprocess.PIPE, 
+            argv,
+            check=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            text=True,
+            close_fds=False,
+            timeout=timeout
         )
         return result.stdout
     except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {command}")
-        print(f"Error: {e.stderr}")
+        if not quiet:
+            print(f"Error executing command: {format_command(argv)}")
+            print(f"Error: {e.stderr}")
+        return ""
+    except (OSError, subprocess.TimeoutExpired) as e:
+        if not quiet:
+            print(f"Error executing command: {format_command(argv)}")
+            print(f"Error: {e}")
         return ""
 
+def get_wifi_device_state() -> Optional[Dict[str, str]]:
+    """Get the name, state and active connection of the Wi-Fi device in one nmcli call."""
+    output = run_command(["nmcli", "-t", "-f", "DEVICE,TYPE,STATE,CONNECTION", "device"])
+    
+    for line in output.split('\n'):
+        # The connection name is the last field, so a colon in it (escaped
+        # as \:) stays inside that field
+        fields = line.split(':', 3)
+        if len(fields) == 4 and fields[1] == "wifi":
+            return {
+                "device": fields[0],
+                "state": fields[2],
+                "connection": fields[3].replace('\\:', ':')
+            }
+    
+    return None
+
+# Name of the Wi-Fi device, remembered once nmcli has reported it
+_wifi_device = ""
+
+def _get_wifi_device() -> str:
+    """Get the Wi-Fi device name, asking nmcli only until it has been found once."""
+    global _wifi_device
+    if not _wifi_device:
+        # A failed lookup (NetworkManager restarting, adapter not up yet) is
+        # not remembered, so the next call tries again
+        device_state = get_wifi_device_state()
+        if device_state:
+            _wifi_device = device_state['device']
+    return _wifi_device
+
 def scan_networks() -> List[Dict[str, str]]:
     """Scan for available Wi-Fi networks and return a list of networks with details."""
     networks = []
     
     # Check if NetworkManager is installed
-    nm_installed = run_command("which nmcli").strip() != ""
+    nm_installed = _NM_INSTALLED
     
     if nm_installed:
         # Use NetworkManager to scan for networks
         print("Using NetworkManager to scan for networks...")
-        output = run_command("sudo nmcli -t -f SSID,SIGNAL,SECURITY device wifi list")
-        
-        for line in output.splitlines():
-            if not line.strip():
+        output = run_command(["nmcli", "-t", "-f", "SSID,SIGNAL,SECURITY", "device", "wifi", "list"])
+        
+        for line in output.split('\n'):
+            # -t rows are SSID:SIGNAL:SECURITY; only the SSID can contain a
+            # colon (escaped as \:), so split the other two fields off the right
+            head, sep, security = line.rpartition(':')
+            ssid, sep, signal_str = head.rpartition(':')
+            if not sep:
+                continue
+            
+            ssid = ssid.replace('\\:', ':')
+            if not ssid:  # Skip networks with empty SSIDs
                 continue
                 
-            parts = line.split(':')
-            if len(parts) >= 3:
-                ssid = parts[0]
-                if not ssid:  # Skip networks with empty SSIDs
-                    continue
-                    
-                try:
-                    signal_strength = int(parts[1])
-                    security = parts[2] if len(parts) > 2 and parts[2] else "Open"
-                    
-                    networks.append({
-                        'ssid': ssid,
-                        'signal_strength': f"{signal_strength}%",
-                        'security': "Open" if security == "--" else "WPA/WPA2"
-                    })
-                except (ValueError, IndexError):
-                    pass
+            try:
+                signal_strength = int(signal_str)
+            except ValueError:
+                continue
+            
+            networks.append({
+                'ssid': ssid,
+                'signal_strength': f"{signal_strength}%",
+                'signal_value': signal_strength,  # Numeric copy for sorting
+                'security': "Open" if security in ("", "--") else "WPA/WPA2"
+            })
     else:
         # Fall back to iwlist if NetworkManager is not available
         print("NetworkManager not found, falling back to iwlist...")
-        output = run_command("sudo iwlist wlan0 scan | grep -E 'ESSID|Quality|Encryption'")
+        output = run_command(["iwlist", "wlan0", "scan"])
         
+        # Walk every field of interest in a single pass over the scan output.
+        # Each "Cell NN" starts a new network; its Quality and Encryption lines
+        # come before its ESSID, so cells rather than ESSIDs delimit networks.
         current_network = {}
         
-        for line in output.splitlines():
-            line = line.strip()
+        for match in _IWLIST_RE.finditer(output):
+            field = match.lastgroup
             
-            if "ESSID" in line:
-                if current_network and 'ssid' in current_network:
+            if field == 'cell':
+                if 'ssid' in current_network:
                     networks.append(current_network)
-                    current_network = {}
-                
-                ssid = re.search(r'ESSID:"(.*?)"', line)
-                if ssid and ssid.group(1):
-                    current_network['ssid'] = ssid.group(1)
+                current_network = {}
             
-            elif "Quality" in line:
-                quality = re.search(r'Quality=(\d+)/(\d+)', line)
-                if quality:
-                    quality_value = int(quality.group(1)) / int(quality.group(2)) * 100
-                    current_network['signal_strength'] = f"{quality_value:.0f}%"
-                    
-                signal = re.search(r'Signal level=(-\d+) dBm', line)
-                if signal:
-                    current_network['signal_level'] = f"{signal.group(1)} dBm"
+            elif field == 'ssid':
+                if match.group('ssid'):
+                    current_network['ssid'] = match.group('ssid')
             
-            elif "Encryption" in line:
-                if "on" in line:
-                    current_network['security'] = "WPA/WPA2"
-                else:
-                    current_network['security'] = "Open"
+            elif field == 'q2':
+                quality_value = round(int(match.group('q1')) / int(match.group('q2')) * 100)
+                current_network['signal_strength'] = f"{quality_value}%"
+                current_network['signal_value'] = quality_value  # Numeric copy for sorting
+            
+            elif field == 'dbm':
+                current_network['signal_level'] = f"{match.group('dbm')} dBm"
+            
+            elif field == 'enc':
+                current_network['security'] = "WPA/WPA2" if match.group('enc') == "on" else "Open"
         
         # Add the last network if it exists
-        if current_network and 'ssid' in current_network:
+        if 'ssid' in current_network:
             networks.append(current_network)
     
     # Filter out duplicate networks, keeping only the one with the highest signal strength
     unique_networks = {}
     for network in networks:
         ssid = network['ssid']
-        signal_str = network.get('signal_strength', '0%')
-        
-        # Extract numeric signal strength
-        signal_value = 0
-        if signal_str:
-            match = re.search(r'(\d+)', signal_str)
-            if match:
-                signal_value = int(match.group(1))
+        signal_value = network.setdefault('signal_value', 0)
         
         # Keep the network with the highest signal strength
         if ssid not in unique_networks or signal_value > unique_networks[ssid]['signal_value']:
-            network['signal_value'] = signal_value  # Store numeric value for sorting
             unique_networks[ssid] = network
     
     # Convert back to list and sort by signal strength
     filtered_networks = list(unique_networks.values())
-    filtered_networks.sort(key=lambda x: x.get('signal_value', 0), reverse=True)
+    filtered_networks.sort(key=lambda x: x['signal_value'], reverse=True)
     
     # Remove the temporary signal_value field
     for network in filtered_networks:
-        if 'signal_value' in network:
-            del network['signal_value']
+        del network['signal_value']
+    
+    # A failed scan returns no output; don't let it suppress the next rescan
+    global _LAST_SCAN_TS
+    if output:
+        _LAST_SCAN_TS = time.monotonic()
     
     # Mark saved networks
     config = load_config()
-    saved_ssids = [network['ssid'] for network in config['saved_networks']]
+    saved_by_ssid = saved_networks_by_ssid(config)
     
     for network in filtered_networks:
-        network['saved'] = network['ssid'] in saved_ssids
+        network['saved'] = network['ssid'] in saved_by_ssid
     
     return filtered_networks
 
+def iwconfig_signal() -> str:
+    """Get the Wi-Fi signal from a single iwconfig call, in dBm if reported, else as a quality percentage."""
+    output = run_command(["iwconfig", "wlan0"])
+    
+    signal = _SIGNAL_DBM_RE.search(output)
+    if signal:
+        return f"{signal.group(1)} dBm"
+    
+    quality = _QUALITY_RE.search(output)
+    if quality:
+        quality_value = int(quality.group(1)) / int(quality.group(2)) * 100
+        return f"{quality_value:.0f}%"
+    
+    return ""
+
 def get_current_connection() -> Dict[str, str]:
     """Get details about the current Wi-Fi connection."""
     ssid = ""
@@ -176,14 +377,14 @@ def get_current_connection() -> Dict[str, str]:
         signal_strength = saved_conn.get('signal_strength', '')
     
     # Check if NetworkManager is installed
-    nm_installed = run_command("which nmcli").strip() != ""
+    nm_installed = _NM_INSTALLED
     
     if nm_installed:
         # Use NetworkManager to get connection details
         print("Using NetworkManager to get connection details...")
         
         # Get active connection
-        connection_output = run_command("sudo nmcli -t -f NAME,DEVICE,TYPE connection show --active")
+        connection_output = run_command(["nmcli", "-t", "-f", "NAME,DEVICE,TYPE", "connection", "show", "--active"])
         
         # Find the Wi-Fi connection
         wifi_connection = None
@@ -197,45 +398,33 @@ def get_current_connection() -> Dict[str, str]:
             ssid = wifi_connection
             
             # Get signal strength
-            signal_output = run_command(f"sudo nmcli -f SIGNAL device wifi list | grep '{ssid}'")
-            if signal_output:
-                signal_match = re.search(r'(\d+)', signal_output)
-                if signal_match:
-                    signal_strength = f"{signal_match.group(1)}%"
+            signal_output = run_command(["nmcli", "-t", "-f", "SSID,SIGNAL", "device", "wifi", "list"])
+            for line in signal_output.split('\n'):
+                row_ssid, sep, signal_str = line.rpartition(':')
+                if sep and row_ssid.replace('\\:', ':') == ssid and signal_str.isdigit():
+                    signal_strength = f"{signal_str}%"
+                    break
             else:
-                # Try to get signal strength in dBm
-                signal_output = run_command("iwconfig wlan0 | grep -i signal")
-                if signal_output:
-                    signal_match = re.search(r'Signal level=(-\d+) dBm', signal_output)
-                    if signal_match:
-                        signal_strength = f"{signal_match.group(1)} dBm"
+                # Fall back to the signal level reported by iwconfig
+                signal_strength = iwconfig_signal() or signal_strength
             
             # Get IP address
-            ip_output = run_command("hostname -I | awk '{print $1}'")
-            ip_address = ip_output.strip() if ip_output else ""
+            ip_addresses = run_command(["hostname", "-I"]).split()
+            ip_address = ip_addresses[0] if ip_addresses else ""
     else:
         # Fall back to iwconfig/ifconfig if NetworkManager is not available
         print("NetworkManager not found, falling back to iwconfig/ifconfig...")
         
         # Get SSID
-        ssid_output = run_command("iwgetid -r")
+        ssid_output = run_command(["iwgetid", "-r"])
         ssid = ssid_output.strip() if ssid_output else ""
         
         # Get IP address
-        ip_output = run_command("hostname -I | awk '{print $1}'")
-        ip_address = ip_output.strip() if ip_output else ""
+        ip_addresses = run_command(["hostname", "-I"]).split()
+        ip_address = ip_addresses[0] if ip_addresses else ""
         
         # Get signal strength
-        signal_output = run_command("iwconfig wlan0 | grep -i quality")
-        if signal_output:
-            quality = re.search(r'Quality=(\d+)/(\d+)', signal_output)
-            if quality:
-                quality_value = int(quality.group(1)) / int(quality.group(2)) * 100
-                signal_strength = f"{quality_value:.0f}%"
-            
-            signal = re.search(r'Signal level=(-\d+) dBm', signal_output)
-            if signal:
-                signal_strength = f"{signal.group(1)} dBm"
+        signal_strength = iwconfig_signal() or signal_strength
     
     # Update config with current connection
     if ssid:
@@ -254,17 +443,85 @@ def get_current_connection() -> Dict[str, str]:
         "signal_strength": signal_strength
     }
 
+# How often wait_for_connection re-checks the link when it has no nmcli
+# monitor to wake it
+CONNECT_POLL_INTERVAL = 1
+
+# Seconds nmcli may spend on each connection attempt, and systemctl on a
+# service restart. Three attempts, the rescan, the restart and the 10 s and
+# 15 s waits then keep connect_to_network to about 100 s, inside the web
+# proxy's 120 s timeout (proxy_read_timeout in install.sh)
+CONNECT_ATTEMPT_TIMEOUT = 15
+SERVICE_RESTART_TIMEOUT = 15
+
+def is_connected_to(ssid: str) -> bool:
+    """Check whether the Wi-Fi device is currently connected to the given network."""
+    if _NM_INSTALLED:
+        device_state = get_wifi_device_state()
+        return bool(device_state) and device_state['state'] == "connected" and device_state['connection'] == ssid
+    
+    return run_command(["iwgetid", "-r"]).strip() == ssid
+
+def wait_for_connection(ssid: str, timeout: float) -> bool:
+    """Wait up to timeout seconds for the connection to ssid to come up.
+    
+    With NetworkManager the link is re-checked whenever `nmcli monitor`
+    reports a change, so this returns as soon as the connection is
+    activated; otherwise it is polled every CONNECT_POLL_INTERVAL seconds.
+    """
+    deadline = time.monotonic() + timeout
+    
+    monitor = None
+    if _NM_INSTALLED:
+        try:
+            monitor = subprocess.Popen(
+                ["nmcli", "monitor"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            print(f"Could not start nmcli monitor: {e}")
+    events = monitor.stdout if monitor else None
+    
+    try:
+        # Started before the first check, so a change in between still wakes us
+        while not is_connected_to(ssid):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            
+            if events:
+                ready, _, _ = select.select([events], [], [], remaining)
+                # Only the wakeup matters; an empty read means the monitor
+                # exited, so fall back to polling
+                if ready and not os.read(events.fileno(), 4096):
+                    events = None
+            else:
+                time.sleep(min(CONNECT_POLL_INTERVAL, remaining))
+        return True
+    finally:
+        if monitor:
+            monitor.terminate()
+            monitor.wait()
+
+def wifi_connect_command(ssid: str, password: Optional[str], *options: str) -> List[str]:
+    """Build the nmcli connect command; SSID and password are passed verbatim, no quoting needed."""
+    argv = ["nmcli", "--wait", str(CONNECT_ATTEMPT_TIMEOUT), "device", "wifi", "connect", ssid]
+    if password:
+        argv += ["password", password]
+    return argv + list(options)
+
+def nmcli_success(output: str) -> bool:
+    """Check whether `nmcli device wifi connect` reported an activated connection."""
+    # Also matches nmcli's "Device 'wlan0' successfully activated with ..." wording
+    return "successfully activated" in output
+
 def connect_to_network(ssid: str, password: Optional[str] = None, security: str = "WPA2") -> Dict[str, Any]:
     """Connect to a Wi-Fi network with the given SSID and password."""
     # Check if network is already saved
     config = load_config()
-    saved_networks = config['saved_networks']
-    
-    network_config = None
-    for network in saved_networks:
-        if network['ssid'] == ssid:
-            network_config = network
-            break
+    network_config = saved_networks_by_ssid(config).get(ssid)
     
     # If not saved and no password provided for secured network
     if not network_config and not password and security != "Open":
@@ -274,22 +531,21 @@ def connect_to_network(ssid: str, password: Optional[str] = None, security: str
         }
     
     # Check if NetworkManager is installed
-    nm_installed = run_command("which nmcli").strip() != ""
+    nm_installed = _NM_INSTALLED
     
     if nm_installed:
         # Use NetworkManager to connect
         print(f"Using NetworkManager to connect to {ssid}...")
         
-        # First, ensure we have the latest scan results
-        run_command("sudo nmcli device wifi rescan")
-        time.sleep(2)  # Give time for the scan to complete
-        
-        # Escape special characters in SSID and password
-        escaped_ssid = ssid.replace('"', '\\"').replace('$', '\\$')
+        # First, ensure we have the latest scan results, unless we scanned recently
+        scan_interval = config.get('settings', {}).get('scan_interval', 30)
+        if time.monotonic() - _LAST_SCAN_TS >= scan_interval:
+            run_command(["nmcli", "device", "wifi", "rescan"])
+            time.sleep(2)  # Give time for the scan to complete
         
-        # Get the current connection before attempting to change it
-        current_before = get_current_connection()
-        print(f"Current connection before: {current_before['ssid']}")
+        # Get the Wi-Fi device and its current connection before attempting to change it
+        device_state = get_wifi_device_state()
+        print(f"Current connection before: {device_state['connection'] if device_state else ''}")
         
         # Try different connection methods
         success = False
@@ -297,17 +553,14 @@ def connect_to_network(ssid: str, password: Optional[str] = None, security: str
         
         try:
             # Method 1: Connect by SSID directly
-            if security == "Open":
-                connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}"'
-            else:
-                escaped_password = (password if password else network_config["password"]).replace('"', '\\"').replace('$', '\\$')
-                connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}" password "{escaped_password}"'
+            network_password = None if security == "Open" else (password if password else network_config["password"])
+            connect_cmd = wifi_connect_command(ssid, network_password)
             
-            print(f"Trying connection method 1: {connect_cmd}")
-            result = run_command(connect_cmd)
+            print(f"Trying connection method 1: {format_command(connect_cmd)}")
+            result = run_command(connect_cmd, timeout=CONNECT_ATTEMPT_TIMEOUT + 5)
             
             # Check if connection was successful
-            if "successfully activated" in result or "Connection successfully activated" in result:
+            if nmcli_success(result):
                 success = True
                 print("Connection successful with method 1")
             else:
@@ -318,18 +571,15 @@ def connect_to_network(ssid: str, password: Optional[str] = None, security: str
                 print("Trying connection method 2...")
                 
                 # Delete any existing connection with the same name
-                run_command(f'sudo nmcli connection delete "{escaped_ssid}" 2>/dev/null || true')
+                run_command(["nmcli", "connection", "delete", ssid], quiet=True)
                 
                 # Create a new connection
-                if security == "Open":
-                    connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}" name "{escaped_ssid}"'
-                else:
-                    connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}" password "{escaped_password}" name "{escaped_ssid}"'
+                connect_cmd = wifi_connect_command(ssid, network_password, "name", ssid)
                 
-                print(f"Connection command: {connect_cmd}")
-                result = run_command(connect_cmd)
+                print(f"Connection command: {format_command(connect_cmd)}")
+                result = run_command(connect_cmd, timeout=CONNECT_ATTEMPT_TIMEOUT + 5)
                 
-                if "successfully activated" in result or "Connection successfully activated" in result:
+                if nmcli_success(result):
                     success = True
                     print("Connection successful with method 2")
                 else:
@@ -339,23 +589,18 @@ def connect_to_network(ssid: str, password: Optional[str] = None, security: str
                     # Method 3: Try connecting with specific device
                     print("Trying connection method 3...")
                     
-                    # Get the Wi-Fi device name
-                    device_output = run_command("sudo nmcli device | grep wifi")
-                    device_match = re.search(r'(\S+)\s+wifi', device_output)
+                    # Reuse the device read before connecting when we have it
+                    device = device_state['device'] if device_state else _get_wifi_device()
                     
-                    if device_match:
-                        device = device_match.group(1)
+                    if device:
                         print(f"Found Wi-Fi device: {device}")
                         
-                        if security == "Open":
-                            connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}" ifname {device}'
-                        else:
-                            connect_cmd = f'sudo nmcli device wifi connect "{escaped_ssid}" password "{escaped_password}" ifname {device}'
+                        connect_cmd = wifi_connect_command(ssid, network_password, "ifname", device)
                         
-                        print(f"Connection command: {connect_cmd}")
-                        result = run_command(connect_cmd)
+                        print(f"Connection command: {format_command(connect_cmd)}")
+                        result = run_command(connect_cmd, timeout=CONNECT_ATTEMPT_TIMEOUT + 5)
                         
-                        if "successfully activated" in result or "Connection successfully activated" in result:
+                        if nmcli_success(result):
                             success = True
                             print("Connection successful with method 3")
                         else:
@@ -368,21 +613,13 @@ def connect_to_network(ssid: str, password: Optional[str] = None, security: str
             print(f"Connection error: {error_message}")
         
         # Wait for connection to establish
-        time.sleep(10)
-        
-        # Check if connected
-        current = get_current_connection()
-        success = current['ssid'] == ssid
+        success = wait_for_connection(ssid, 10)
         
         # If still not connected, try one more approach - restart NetworkManager
         if not success:
             print("Connection not established. Trying to restart NetworkManager...")
-            run_command("sudo systemctl restart NetworkManager")
-            time.sleep(15)  # Give more time for NetworkManager to restart and connect
-            
-            # Check again
-            current = get_current_connection()
-            success = current['ssid'] == ssid
+            run_command(["systemctl", "restart", "NetworkManager"], timeout=SERVICE_RESTART_TIMEOUT)
+            success = wait_for_connection(ssid, 15)  # Give more time for NetworkManager to restart and connect
     else:
         # Fall back to wpa_supplicant if NetworkManager is not available
         print("NetworkManager not found, falling back to wpa_supplicant...")
@@ -409,27 +646,22 @@ network={{
             f.write(wpa_config)
         
         # Apply configuration
-        run_command(f"sudo cp {temp_config_path} /etc/wpa_supplicant/wpa_supplicant.conf")
+        try:
+            shutil.copyfile(temp_config_path, "/etc/wpa_supplicant/wpa_supplicant.conf")
+        except OSError as e:
+            print(f"Error applying wpa_supplicant configuration: {e}")
         
         # Restart networking with more robust approach
-        run_command("sudo wpa_cli -i wlan0 reconfigure")
-        run_command("sudo ip link set wlan0 down")
-        run_command("sudo ip link set wlan0 up")
-        run_command("sudo systemctl restart dhcpcd")
+        run_command(["wpa_cli", "-i", "wlan0", "reconfigure"])
+        run_command(["ip", "link", "set", "wlan0", "down"])
+        run_command(["ip", "link", "set", "wlan0", "up"])
+        run_command(["systemctl", "restart", "dhcpcd"], timeout=SERVICE_RESTART_TIMEOUT)
         
         # Wait for connection
-        time.sleep(10)
-        
-        # Check if connected
-        current = get_current_connection()
-        success = current['ssid'] == ssid
+        success = wait_for_connection(ssid, 10)
     
-    # Wait longer for connection to establish
-    time.sleep(5)
-    
-    # Check if connected
-    current = get_current_connection()
-    success = current['ssid'] == ssid
+    # Read the details of the new connection once it is up
+    current = get_current_connection() if success else {}
     
     # Save network if connection successful and not already saved
     if success and not network_config and password:
@@ -438,7 +670,7 @@ network={{
     return {
         "success": success,
         "message": "Connected successfully" if success else "Failed to connect",
-        "connection": current if success else {}
+        "connection": current
     }
 
 def save_network(ssid: str, password: str, security: str = "WPA2") -> Dict[str, Any]:
@@ -446,15 +678,16 @@ def save_network(ssid: str, password: str, security: str = "WPA2") -> Dict[str,
     config = load_config()
     
     # Check if network already saved
-    for network in config['saved_networks']:
-        if network['ssid'] == ssid:
-            network['password'] = password
-            network['security'] = security
-            save_config(config)
-            return {
-                "success": True,
-                "message": f"Updated saved network: {ssid}"
-            }
+    network = saved_networks_by_ssid(config).get(ssid)
+    if network:
+        network['password'] = password
+        network['security'] = security
+        save_config(config)
+        flush_config()
+        return {
+            "success": True,
+            "message": f"Updated saved network: {ssid}"
+        }
     
     # Add new network
     config['saved_networks'].append({
@@ -465,6 +698,7 @@ def save_network(ssid: str, password: str, security: str = "WPA2") -> Dict[str,
     })
     
     save_config(config)
+    flush_config()
     
     return {
         "success": True,
@@ -484,11 +718,10 @@ def forget_network(ssid: str) -> Dict[str, Any]:
         }
     
     # Find and remove the network
-    initial_count = len(config['saved_networks'])
-    config['saved_networks'] = [n for n in config['saved_networks'] if n['ssid'] != ssid]
-    
-    if len(config['saved_networks']) < initial_count:
+    if ssid in saved_networks_by_ssid(config):
+        config['saved_networks'] = [n for n in config['saved_networks'] if n['ssid'] != ssid]
         save_config(config)
+        flush_config()
         return {
             "success": True,
             "message": f"Forgot network: {ssid}"
@@ -499,17 +732,68 @@ def forget_network(ssid: str) -> Dict[str, Any]:
             "message": f"Network not found: {ssid}"
         }
 
-def run_diagnostics() -> Dict[str, Any]:
-    """Run network diagnostics and return results."""
+# DNS checks run by run_diagnostics: each command, and the text its output
+# must contain to count as resolved (None for any non-empty output)
+DNS_PROBES = [
+    (["nslookup", "google.com"], "Address:"),
+    (["host", "google.com"], "has address"),
+    (["dig", "+short", "google.com"], None),
+    (["ping", "-c", "1", "google.com"], "64 bytes from"),
+]
+DNS_PROBE_TIMEOUT = 10
+
+# Workers that run the diagnostic checks concurrently: the status refresh,
+# the connectivity ping and every DNS probe
+_probe_pool = ThreadPoolExecutor(max_workers=len(DNS_PROBES) + 2, thread_name_prefix='probe')
+
+def _dns_probe(argv: List[str], marker: Optional[str]) -> bool:
+    """Run one DNS check and report whether it resolved."""
+    output = run_command(argv, timeout=DNS_PROBE_TIMEOUT)
+    return marker in output if marker else bool(output.strip())
+
+def _start_dns_probes() -> List[Future]:
+    """Start all DNS checks at once."""
+    return [_probe_pool.submit(_dns_probe, argv, marker) for argv, marker in DNS_PROBES]
+
+def _any_dns_resolved(probes: List[Future]) -> bool:
+    """Wait for started DNS checks, returning as soon as any of them resolves."""
+    try:
+        return any(probe.result() for probe in as_completed(probes))
+    finally:
+        # Drop any checks still queued; ones already running finish in the background
+        for probe in probes:
+            probe.cancel()
+
+def check_dns_resolution() -> bool:
+    """Run all DNS checks at once, returning as soon as any of them resolves."""
+    return _any_dns_resolved(_start_dns_probes())
+
+def run_diagnostics(on_connection: Optional[Callable[[Dict[str, str]], None]] = None) -> Dict[str, Any]:
+    """Run network diagnostics and return results.
+    
+    The connection status is refreshed along the way; on_connection, if
+    given, receives it as soon as it is known, so callers that also want
+    the status need not fetch it a second time.
+    """
     results = {
         "connectivity": False,
         "ping_results": {},
         "dns_resolution": False
     }
     
+    # The checks don't depend on each other, so start them all at once
+    current_job = _probe_pool.submit(get_current_connection)
+    ping_job = _probe_pool.submit(run_command, ["ping", "-c", "4", "8.8.8.8"])
+    dns_probes = _start_dns_probes()
+    
     # Check current connection
-    current = get_current_connection()
+    current = current_job.result()
+    if on_connection:
+        on_connection(current)
     if not current['ssid']:
+        ping_job.cancel()
+        for probe in dns_probes:
+            probe.cancel()
         return {
             "success": False,
             "message": "Not connected to any network",
@@ -517,45 +801,29 @@ def run_diagnostics() -> Dict[str, Any]:
         }
     
     # Check internet connectivity (ping google.com)
-    ping_output = run_command("ping -c 4 8.8.8.8")
+    ping_output = ping_job.result()
     results["connectivity"] = "0% packet loss" in ping_output or "64 bytes from" in ping_output
     
-    # Parse ping results
-    ping_times = re.findall(r'time=(\d+\.\d+) ms', ping_output)
-    if ping_times:
+    # Parse ping results, accumulating min/max/sum in a single pass
+    ping_min, ping_max, ping_sum, ping_count = math.inf, 0.0, 0.0, 0
+    for match in _PING_TIME_RE.finditer(ping_output):
+        ping_time = float(match.group(1))
+        ping_sum += ping_time
+        ping_count += 1
+        if ping_time < ping_min:
+            ping_min = ping_time
+        if ping_time > ping_max:
+            ping_max = ping_time
+    
+    if ping_count:
         results["ping_results"] = {
-            "min": min(float(t) for t in ping_times),
-            "max": max(float(t) for t in ping_times),
-            "avg": sum(float(t) for t in ping_times) / len(ping_times)
+            "min": ping_min,
+            "max": ping_max,
+            "avg": ping_sum / ping_count
         }
     
     # Check DNS resolution - try multiple methods
-    dns_resolution = False
-    
-    # Method 1: nslookup
-    dns_output = run_command("nslookup google.com")
-    if "Address:" in dns_output:
-        dns_resolution = True
-    
-    # Method 2: host command
-    if not dns_resolution:
-        host_output = run_command("host google.com")
-        if "has address" in host_output:
-            dns_resolution = True
-    
-    # Method 3: dig command
-    if not dns_resolution:
-        dig_output = run_command("dig +short google.com")
-        if dig_output.strip():
-            dns_resolution = True
-    
-    # Method 4: ping with hostname
-    if not dns_resolution:
-        ping_dns_output = run_command("ping -c 1 google.com")
-        if "64 bytes from" in ping_dns_output:
-            dns_resolution = True
-    
-    results["dns_resolution"] = dns_resolution
+    results["dns_resolution"] = _any_dns_resolved(dns_probes)
     
     return {
         "success": True,
@@ -563,10 +831,19 @@ def run_diagnostics() -> Dict[str, Any]:
         "results": results
     }
 
+# ANSI escape that moves the cursor home and clears the terminal
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+
 def terminal_interface() -> None:
     """Run the terminal-based interface for the Wi-Fi manager."""
     while True:
-        os.system('clear')
+        # Write out anything the last option changed
+        flush_config()
+        
+        # Clear the screen ourselves rather than running the clear command
+        if sys.stdout.isatty():
+            sys.stdout.write(CLEAR_SCREEN)
+            sys.stdout.flush()
         print("=" * 50)
         print("JLBMaritime Wi-Fi Manager - Terminal Interface")
         print("=" * 50)